@@ -1,6 +1,6 @@
-import pdfplumber
+import pypdfium2 as pdfium
 
 pdf_path = 'LLM_Assignment.pdf'
-with pdfplumber.open(pdf_path) as pdf:
-    full_text = '\n'.join([page.extract_text() for page in pdf.pages])
-    print(full_text)
+pdf = pdfium.PdfDocument(pdf_path)
+full_text = '\n'.join([page.get_textpage().get_text_range() for page in pdf])
+print(full_text)
@@ -5,6 +5,8 @@ No LangChain.
 """
 
 import os
+import logging
+import logging.handlers
 from pathlib import Path
 from rag_system import RAGSystem, run_evaluation
 
@@ -18,9 +20,38 @@ QUERY = "What was Apple's revenue in 2024?"
 
 MODEL_NAME = "microsoft/Phi-3-mini-4k-instruct"
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+COMPILE_LLM = False  # torch.compile Phi-3; slow first calls, faster afterwards
 
 INDEX_DIR = "./rag_index"
 
+VERBOSE = False     # also log every evaluation answer (DEBUG level)
+COMPRESS_RESULTS = False  # evaluation results as .jsonl.zst (needs zstandard)
+PRETTY_RESULTS = False    # also write an indented .json copy
+
+
+logger = logging.getLogger(__name__)
+
+
+def configure_logging():
+    # Records are buffered and written in bulk: flushed every 1000 records,
+    # on any warning or error, at each flush_logs() and at exit
+    handler = logging.handlers.MemoryHandler(
+        capacity=1000,
+        flushLevel=logging.WARNING,
+        target=logging.StreamHandler()
+    )
+    logging.basicConfig(
+        level=logging.DEBUG if VERBOSE else logging.INFO,
+        format="%(message)s",
+        handlers=[handler]
+    )
+
+
+def flush_logs():
+    # Show buffered status before printing results or a long-running step
+    for handler in logging.getLogger().handlers:
+        handler.flush()
+
 
 # ==============================
 # MAIN EXECUTION
@@ -28,12 +59,14 @@ INDEX_DIR = "./rag_index"
 
 def main():
 
-    print("Initializing RAG system (HF Phi-3)...")
+    configure_logging()
+    logger.info("Initializing RAG system (HF Phi-3)...")
 
     rag = RAGSystem(
         model_name=MODEL_NAME,
         embedding_model=EMBEDDING_MODEL,
-        use_reranker=True # required
+        use_reranker=True, # required
+        compile_llm=COMPILE_LLM
     )
 
     # Documents (ensure PDFs are uploaded to Kaggle)
@@ -50,36 +83,37 @@ def main():
 
     for doc in documents:
         if not os.path.exists(doc["path"]):
-            print(f"Warning: {doc['path']} not found")
+            logger.warning("Warning: %s not found", doc["path"])
 
     # ==============================
     # INDEX MODE
     # ==============================
 
     if MODE == "index":
-        print("\nMode: Index and save")
+        logger.info("Mode: Index and save")
 
         rag.ingest_documents(documents)
         rag.save_index(INDEX_DIR)
 
-        print(f"Index saved to {INDEX_DIR}")
+        logger.info("Index saved to %s", INDEX_DIR)
 
     # ==============================
     # QUERY MODE
     # ==============================
 
     elif MODE == "query":
-        print("\nMode: Query")
+        logger.info("Mode: Query")
 
         if os.path.exists(INDEX_DIR):
             rag.load_index(INDEX_DIR)
         else:
-            print("Index not found. Creating index...")
+            logger.info("Index not found. Creating index...")
             rag.ingest_documents(documents)
             rag.save_index(INDEX_DIR)
 
         result = rag.answer_question(QUERY)
 
+        flush_logs()
         print(f"\nQuestion: {QUERY}")
         print(f"\nAnswer:\n{result['answer']}")
         print(f"\nSources:\n{result['sources']}")
@@ -89,17 +123,22 @@ def main():
     # ==============================
 
     elif MODE == "evaluate":
-        print("\nMode: Evaluate (All test questions)")
+        logger.info("Mode: Evaluate (All test questions)")
 
         if os.path.exists(INDEX_DIR):
-            print(f"Loading index from {INDEX_DIR}...")
+            logger.info("Loading index from %s...", INDEX_DIR)
             rag.load_index(INDEX_DIR)
         else:
-            print("Index not found. Creating index...")
+            logger.info("Index not found. Creating index...")
             rag.ingest_documents(documents)
             rag.save_index(INDEX_DIR)
 
-        results = run_evaluation(rag)
+        flush_logs()
+        results = run_evaluation(
+            rag,
+            compress=COMPRESS_RESULTS,
+            pretty=PRETTY_RESULTS
+        )
 
         return results
 
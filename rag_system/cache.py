@@ -0,0 +1,105 @@
+"""Answer caching for the RAG pipeline."""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+import faiss
+import numpy as np
+
+
+def _as_row(query_emb: np.ndarray) -> np.ndarray:
+    return np.ascontiguousarray(query_emb, dtype=np.float32).reshape(1, -1)
+
+
+class SemanticCache:
+    """
+    Answer cache keyed by query embedding.
+
+    A lookup hits when a previously answered query has cosine similarity
+    >= threshold with the new one, so paraphrases reuse the stored answer.
+    Embeddings must be L2-normalized. Least recently used entries are
+    evicted once more than max_items are stored.
+    """
+
+    def __init__(self, threshold: float = 0.87, max_items: int = 1024):
+        self.threshold = threshold
+        self.max_items = max_items
+        self.index = None
+        self.entries: "OrderedDict[int, Dict]" = OrderedDict()
+        self._next_id = 0
+
+    def get(self, query_emb: np.ndarray) -> Optional[Dict]:
+        if not self.entries:
+            return None
+
+        scores, ids = self.index.search(_as_row(query_emb), 1)
+        entry_id, score = int(ids[0][0]), float(scores[0][0])
+
+        if entry_id < 0 or score < self.threshold:
+            return None
+
+        self.entries.move_to_end(entry_id)
+        return self.entries[entry_id]
+
+    def put(self, query_emb: np.ndarray, result: Dict) -> None:
+        if self.index is None:
+            # IDMap so evicted entries can be removed by id
+            self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(query_emb.shape[-1]))
+
+        entry_id = self._next_id
+        self._next_id += 1
+
+        self.index.add_with_ids(
+            _as_row(query_emb),
+            np.array([entry_id], dtype=np.int64)
+        )
+        self.entries[entry_id] = result
+
+        if len(self.entries) > self.max_items:
+            evicted_id, _ = self.entries.popitem(last=False)
+            self.index.remove_ids(np.array([evicted_id], dtype=np.int64))
+
+    def clear(self) -> None:
+        if self.index is not None:
+            self.index.reset()
+        self.entries.clear()
+
+
+class TTLCache:
+    """
+    Exact-match LRU cache whose entries also expire ttl_sec after insertion.
+    Safe to share between threads (the async paths use worker threads).
+    """
+
+    def __init__(self, max_items: int = 2048, ttl_sec: float = 60.0):
+        self.max_items = max_items
+        self.ttl_sec = ttl_sec
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+
+            expires_at, value = item
+            if time.monotonic() >= expires_at:
+                del self._data[key]
+                return default
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_sec, value)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
@@ -5,51 +5,110 @@ Optimized for Kaggle / Python 3.12 compatibility.
 
 import os
 import json
-from typing import List, Dict, Tuple
-import pdfplumber
+import shutil
+from collections.abc import Sequence
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Tuple
+import pypdfium2 as pdfium
 from sentence_transformers import SentenceTransformer
 import faiss
 import numpy as np
+import torch
+
+# Let FAISS parallelize batched searches across every core
+faiss.omp_set_num_threads(os.cpu_count() or 1)
+
+# Code points str.isspace() treats as whitespace (none lie above U+3000)
+_WHITESPACE = np.array(
+    [c for c in range(0x3001) if chr(c).isspace()],
+    dtype=np.uint32
+)
+
+
+def _as_float32(embeddings: np.ndarray) -> np.ndarray:
+    """
+    Return embeddings as a C-contiguous float32 array for FAISS.
+    Copies only when needed: the fp16 GPU encoder returns float16,
+    the CPU encoder already returns float32.
+    """
+    return np.ascontiguousarray(embeddings, dtype=np.float32)
+
+
+@contextmanager
+def _replacing(path: str):
+    """
+    Yield a temporary path beside path, moved over path once written.
+
+    Loaded stores memory-map their files; writing in place would truncate
+    the mapping under them. After os.replace they keep reading the old,
+    now unlinked file.
+    """
+    tmp_path = path + ".tmp"
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
 
 class DocumentIngestor:
-    """Handles PDF parsing and text chunking."""
+    """
+    Handles PDF parsing and text chunking.
+    chunk_size and overlap are measured in characters, not tokens.
+    """
 
     def __init__(self, chunk_size: int = 500, overlap: int = 50):
         self.chunk_size = chunk_size
         self.overlap = overlap
 
     def parse_pdf(self, pdf_path: str, doc_name: str) -> List[Dict]:
-        chunks = []
-
-        with pdfplumber.open(pdf_path) as pdf:
+        pdf = pdfium.PdfDocument(pdf_path)
+        try:
             full_text = ""
-            page_mapping = {}
+            page_starts = []
+
+            for page in pdf:
+                textpage = page.get_textpage()
+                # PDFium separates lines with CRLF
+                page_text = textpage.get_text_range().replace("\r\n", "\n")
+                textpage.close()
+                page.close()
 
-            for page_num, page in enumerate(pdf.pages, 1):
-                page_text = page.extract_text() or ""
-                start_pos = len(full_text)
+                page_starts.append(len(full_text))
                 full_text += page_text + "\n\n"
-                end_pos = len(full_text)
-                page_mapping[(start_pos, end_pos)] = page_num
+        finally:
+            pdf.close()
 
         # Overlapping chunking
         step = self.chunk_size - self.overlap
-        for i in range(0, len(full_text), step):
-            chunk_text = full_text[i:i + self.chunk_size]
+        offsets = np.arange(0, len(full_text), step, dtype=np.int64)
+
+        # Page of each chunk = page containing its first character
+        starts = np.array(page_starts, dtype=np.int64)
+        page_idx = np.searchsorted(starts, offsets, side="right") - 1
+        pages = np.maximum(page_idx, 0) + 1
+
+        # Length of each chunk after .strip(), computed from the positions
+        # of non-whitespace characters so rejected chunks are never sliced
+        codepoints = np.frombuffer(full_text.encode("utf-32-le"), dtype=np.uint32)
+        non_ws = np.flatnonzero(~np.isin(codepoints, _WHITESPACE))
+        ends = np.minimum(offsets + self.chunk_size, len(full_text))
 
-            if len(chunk_text.strip()) < 50:
-                continue
+        if len(non_ws):
+            first = np.searchsorted(non_ws, offsets, side="left")
+            last = np.searchsorted(non_ws, ends, side="left") - 1
+            first_pos = non_ws[np.minimum(first, len(non_ws) - 1)]
+            last_pos = non_ws[np.maximum(last, 0)]
+            stripped_len = np.where(last >= first, last_pos - first_pos + 1, 0)
+        else:
+            stripped_len = np.zeros(len(offsets), dtype=np.int64)
 
-            # Determine page number
-            page_num = 1
-            chunk_start = i
-            chunk_end = min(i + self.chunk_size, len(full_text))
-            
-            for (start, end), page in page_mapping.items():
-                if chunk_start < end and chunk_end > start:  # Overlap check
-                    page_num = page
-                    break
+        keep = stripped_len >= 50
+
+        chunks = []
+        for i, page_num in zip(offsets[keep].tolist(), pages[keep].tolist()):
+            chunk_text = full_text[i:i + self.chunk_size]
 
             chunks.append({
                 "id": f"{doc_name}_{len(chunks)}",
@@ -62,14 +121,334 @@ class DocumentIngestor:
         return chunks
 
 
+class ChunkStore(Sequence):
+    """
+    Chunk metadata kept as columns instead of a list of dicts.
+
+    Saved chunks are stored as numpy columns (ids, document codes, pages,
+    positions, text offsets) plus one concatenated UTF-8 text blob that is
+    memory-mapped on load and decoded only when a chunk is accessed.
+    Chunks added after loading are kept as plain dicts until the next save.
+    """
+
+    def __init__(self):
+        self._ids = np.empty(0, dtype=str)
+        self._documents: List[str] = []
+        self._doc_codes = np.empty(0, dtype=np.uint16)
+        self._pages = np.empty(0, dtype=np.uint16)
+        self._positions = np.empty(0, dtype=np.int64)
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._text_blob = b""
+        self._tail: List[Dict] = []
+
+    def __len__(self) -> int:
+        return len(self._positions) + len(self._tail)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+
+        idx = int(idx)
+        if idx < 0:
+            idx += len(self)
+        if idx < 0:
+            raise IndexError("chunk index out of range")
+
+        n_stored = len(self._positions)
+        if idx >= n_stored:
+            return self._tail[idx - n_stored]
+
+        start, end = self._offsets[idx], self._offsets[idx + 1]
+        return {
+            "id": str(self._ids[idx]),
+            "text": bytes(self._text_blob[start:end]).decode("utf-8"),
+            "document": self._documents[self._doc_codes[idx]],
+            "page": int(self._pages[idx]),
+            "position": int(self._positions[idx])
+        }
+
+    def extend(self, chunks: List[Dict]) -> None:
+        self._tail.extend(chunks)
+
+    def save(self, save_dir: str) -> None:
+        chunks = list(self)
+        documents = list(dict.fromkeys(chunk["document"] for chunk in chunks))
+        doc_codes = {name: code for code, name in enumerate(documents)}
+
+        texts = [chunk["text"].encode("utf-8") for chunk in chunks]
+        offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        np.cumsum([len(text) for text in texts], out=offsets[1:])
+
+        # texts.bin may be the file this store is memory-mapped from
+        with _replacing(os.path.join(save_dir, "texts.bin")) as path:
+            with open(path, "wb") as f:
+                f.write(b"".join(texts))
+
+        np.savez(
+            os.path.join(save_dir, "chunks.npz"),
+            ids=np.array([chunk["id"] for chunk in chunks], dtype=str),
+            doc_codes=np.array(
+                [doc_codes[chunk["document"]] for chunk in chunks],
+                dtype=np.uint16
+            ),
+            pages=np.array([chunk["page"] for chunk in chunks], dtype=np.uint16),
+            positions=np.array(
+                [chunk["position"] for chunk in chunks],
+                dtype=np.int64
+            ),
+            offsets=offsets
+        )
+
+        with open(os.path.join(save_dir, "meta.json"), "w") as f:
+            json.dump({"documents": documents}, f)
+
+    @classmethod
+    def load(cls, save_dir: str) -> "ChunkStore":
+        store = cls()
+
+        with open(os.path.join(save_dir, "meta.json"), "r") as f:
+            store._documents = json.load(f)["documents"]
+
+        with np.load(os.path.join(save_dir, "chunks.npz")) as data:
+            store._ids = data["ids"]
+            store._doc_codes = data["doc_codes"]
+            store._pages = data["pages"]
+            store._positions = data["positions"]
+            store._offsets = data["offsets"]
+
+        text_path = os.path.join(save_dir, "texts.bin")
+        if os.path.getsize(text_path) > 0:
+            store._text_blob = np.memmap(text_path, dtype=np.uint8, mode="r")
+
+        return store
+
+
+class ONNXEncoder:
+    """
+    ONNX Runtime stand-in for SentenceTransformer.encode (mean pooling).
+    Requires the optional `optimum[onnxruntime]` package. The first load
+    exports the model to ONNX and saves it under cache_dir; later loads
+    read the saved export.
+    """
+
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        max_seq_length: int = 256,
+        cache_dir: str = ".onnx_cache"
+    ):
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+
+        model_id = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+        export_dir = os.path.join(cache_dir, model_id.replace("/", "--"))
+
+        if os.path.isdir(export_dir):
+            self.tokenizer = AutoTokenizer.from_pretrained(export_dir)
+            self.model = ORTModelForFeatureExtraction.from_pretrained(export_dir, export=False)
+        else:
+            self.tokenizer = AutoTokenizer.from_pretrained(model_id)
+            self.model = ORTModelForFeatureExtraction.from_pretrained(model_id, export=True)
+
+            # Write beside the target and rename, so an interrupted save never
+            # leaves a half-written export that later loads would pick up
+            tmp_dir = export_dir + ".tmp"
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            self.model.save_pretrained(tmp_dir)
+            self.tokenizer.save_pretrained(tmp_dir)
+            os.replace(tmp_dir, export_dir)
+
+        self.max_seq_length = max_seq_length
+
+    def encode(
+        self,
+        sentences: List[str],
+        batch_size: int = 32,
+        convert_to_numpy: bool = True,
+        normalize_embeddings: bool = False,
+        show_progress_bar: bool = False
+    ) -> np.ndarray:
+        if isinstance(sentences, str):
+            sentences = [sentences]
+
+        # Length-sorted batches keep padding to a minimum
+        order = np.argsort([-len(sentence) for sentence in sentences], kind="stable")
+        batches = []
+
+        for start in range(0, len(sentences), batch_size):
+            batch = [sentences[i] for i in order[start:start + batch_size]]
+            inputs = self.tokenizer(
+                batch,
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np"
+            )
+            token_embeddings = self.model(**inputs).last_hidden_state
+
+            mask = inputs["attention_mask"][..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            batches.append(pooled.astype(np.float32))
+
+        if not batches:
+            return np.empty((0, 0), dtype=np.float32)
+
+        embeddings = np.empty((len(sentences), batches[0].shape[1]), dtype=np.float32)
+        embeddings[order] = np.concatenate(batches)
+
+        if normalize_embeddings:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings /= np.clip(norms, 1e-12, None)
+
+        return embeddings
+
+
 class VectorStore:
     """Manages embeddings and vector search (cosine similarity)."""
 
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
-        self.model = SentenceTransformer(model_name)
+    # Corpus sizes (vectors in the first batch) at which "auto" switches
+    # from an exact scan to HNSW, then 8-bit HNSW, then IVFPQ
+    HNSW_MIN_VECTORS = 4096
+    HNSW_SQ_MIN_VECTORS = 10_000
+    IVFPQ_MIN_VECTORS = 100_000
+
+    INDEX_TYPES = ("auto", "flat", "hnsw", "hnsw_sq", "ivfpq")
+
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        use_gpu: bool = True,
+        nprobe: int = 16,
+        backend: str = "torch",
+        index_type: str = "auto",
+        ef_search: int = 64
+    ):
+        if index_type not in self.INDEX_TYPES:
+            raise ValueError(f"Unknown index type: {index_type}")
+
+        self.model_name = model_name
+        self.backend = backend
+        # Device and precision the encoder runs at (ONNX Runtime: fp32 on CPU)
+        self.encoder_device, self.encoder_dtype = "cpu", "fp32"
+        if backend == "onnx":
+            self.model = ONNXEncoder(model_name)
+        elif backend == "torch":
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+            self.model = SentenceTransformer(model_name, device=device)
+            if device == "cuda":
+                # fp16 halves encoder memory traffic; cosine scores barely move
+                self.model.half()
+                self.encoder_device, self.encoder_dtype = "cuda", "fp16"
+            else:
+                torch.set_num_threads(os.cpu_count() or 1)
+        else:
+            raise ValueError(f"Unknown embedding backend: {backend}")
+
         self.index = None
-        self.chunks = []
+        self.chunks = ChunkStore()
         self.embedding_dim = None
+        self.index_type = index_type
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+
+        # fp16 copy of every embedding (row i = chunk i), used to re-score
+        # candidates from quantized indexes; None if it does not cover them all
+        self.emb = None
+        self.approximate = False
+
+        # GPU search needs the faiss-gpu build and a visible device
+        self.use_gpu = (
+            use_gpu
+            and hasattr(faiss, "StandardGpuResources")
+            and faiss.get_num_gpus() > 0
+        )
+        self.res = faiss.StandardGpuResources() if self.use_gpu else None
+
+    @property
+    def encoder_signature(self) -> str:
+        """Everything about the encoder that changes the vectors it produces."""
+        return (
+            f"{self.model_name}|{self.backend}|{self.encoder_device}"
+            f"|{self.encoder_dtype}|{self.model.max_seq_length}"
+        )
+
+    def _to_gpu(self, index):
+        """Move a CPU index onto GPU 0 when GPU search is enabled."""
+        # The GPU backend has no HNSW index; keep those on CPU
+        if not self.use_gpu or isinstance(index, faiss.IndexHNSW):
+            return index
+        if isinstance(index, faiss.IndexScalarQuantizer):
+            # Nor a flat scalar-quantizer one. save() stores flat indexes as
+            # fp16 SQ, so decode it back into a flat index and let the GPU
+            # copy keep the same fp16 storage
+            flat = faiss.IndexFlat(index.d, index.metric_type)
+            flat.add(index.reconstruct_n(0, index.ntotal))
+            co = faiss.GpuClonerOptions()
+            co.useFloat16 = True
+            return faiss.index_cpu_to_gpu(self.res, 0, flat, co)
+        return faiss.index_cpu_to_gpu(self.res, 0, index)
+
+    def _to_cpu(self, index):
+        """Bring a (possibly GPU) index back to host memory for serialization."""
+        if not self.use_gpu or not isinstance(index, faiss.GpuIndex):
+            return index
+        return faiss.index_gpu_to_cpu(index)
+
+    @staticmethod
+    def _is_quantized(index) -> bool:
+        """Whether the index returns approximate (lossy-code) scores."""
+        return isinstance(index, (faiss.IndexIVFPQ, faiss.IndexHNSWSQ))
+
+    def _select_index_type(self, n: int) -> str:
+        if self.index_type != "auto":
+            return self.index_type
+        if n < self.HNSW_MIN_VECTORS:
+            return "flat"
+        if n < self.HNSW_SQ_MIN_VECTORS:
+            return "hnsw"
+        if n < self.IVFPQ_MIN_VECTORS:
+            return "hnsw_sq"
+        return "ivfpq"
+
+    def _build_index(self, embeddings: np.ndarray):
+        """
+        Create an empty (but trained) index sized for the first batch.
+
+        flat:    exact IndexFlatIP, 4 bytes/dim
+        hnsw:    graph search over float32 vectors
+        hnsw_sq: graph search over 8-bit codes, 1 byte/dim
+        ivfpq:   each query scans nprobe/nlist lists of m-byte PQ codes
+        """
+        n, dim = embeddings.shape
+        index_type = self._select_index_type(n)
+
+        if index_type == "flat":
+            return faiss.IndexFlatIP(dim)
+
+        if index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(dim, 32, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efSearch = self.ef_search
+            return index
+
+        if index_type == "hnsw_sq":
+            index = faiss.IndexHNSWSQ(
+                dim, faiss.ScalarQuantizer.QT_8bit, 32, faiss.METRIC_INNER_PRODUCT
+            )
+            index.train(embeddings)
+            index.hnsw.efSearch = self.ef_search
+            return index
+
+        # k-means wants ~39 training points per list
+        nlist = max(1, min(1024, n // 39))
+        # 48 sub-quantizers of 8 dims for MiniLM's 384; m must divide dim
+        m = next((m for m in (48, 32, 24, 16, 8) if dim % m == 0), 1)
+        quantizer = faiss.IndexFlatIP(dim)
+        index = faiss.IndexIVFPQ(
+            quantizer, dim, nlist, m, 8, faiss.METRIC_INNER_PRODUCT
+        )
+        index.train(embeddings)
+        index.nprobe = self.nprobe
+        return index
 
     # -------------------------------
     # Add Chunks (Efficient Version)
@@ -83,48 +462,109 @@ class VectorStore:
         if not chunks:
             return
 
-        new_texts = [chunk["text"] for chunk in chunks]
-        new_embeddings = self.model.encode(
-            new_texts,
+        self.add_precomputed(chunks, self.embed([chunk["text"] for chunk in chunks]))
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """L2-normalized float32 embeddings, one row per text."""
+        embeddings = self.model.encode(
+            texts,
+            batch_size=128,  # batches are length-sorted internally
             convert_to_numpy=True,
-            normalize_embeddings=True  # important for cosine similarity
+            normalize_embeddings=True,  # important for cosine similarity
+            show_progress_bar=False
         )
+        return _as_float32(embeddings)
+
+    def add_precomputed(self, chunks: List[Dict], embeddings: np.ndarray) -> None:
+        """Add chunks whose embeddings (from embed) are already known."""
+        if not chunks:
+            return
+
+        new_embeddings = _as_float32(embeddings)
 
         if self.index is None:
             self.embedding_dim = new_embeddings.shape[1]
-            self.index = faiss.IndexFlatIP(self.embedding_dim)
+            index = self._build_index(new_embeddings)
+            self.approximate = self._is_quantized(index)
+            self.index = self._to_gpu(index)
+            self.emb = new_embeddings.astype(np.float16)
+        elif self.emb is not None:
+            self.emb = np.concatenate([self.emb, new_embeddings.astype(np.float16)])
 
-        self.index.add(new_embeddings.astype(np.float32))
+        self.index.add(new_embeddings)
         self.chunks.extend(chunks)
 
+    def rerank(self, query_embs: np.ndarray, cand_idx: np.ndarray) -> np.ndarray:
+        """
+        Exact cosine scores of candidate chunks from the stored embeddings.
+        cand_idx is (queries, k); padding ids (-1) score -inf.
+        """
+        valid = cand_idx >= 0
+        cand_emb = self.emb[np.where(valid, cand_idx, 0)].astype(np.float32)
+        scores = np.einsum("qkd,qd->qk", cand_emb, query_embs)
+        scores[~valid] = -np.inf
+        return scores
+
     # -------------------------------
     # Search
     # -------------------------------
     def search(self, query: str, k: int = 5) -> List[Tuple[Dict, float]]:
+        return self.search_batch([query], k=k)[0]
+
+    def encode_queries(self, queries: List[str]) -> np.ndarray:
+        """L2-normalized float32 query embeddings, one row per query."""
+        query_embeddings = self.model.encode(
+            queries,
+            batch_size=64,
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        )
+        return _as_float32(query_embeddings)
+
+    def search_batch(
+        self,
+        queries: List[str],
+        k: int = 5,
+        query_embeddings: Optional[np.ndarray] = None
+    ) -> List[List[Tuple[Dict, float]]]:
+        """
+        Search several queries at once.
+        One encode call and one index.search call for the whole batch,
+        so FAISS can spread the query matrix across threads.
+        Pass query_embeddings (from encode_queries) to skip the encode.
+        """
         if self.index is None:
             raise ValueError("Vector index not initialized. Add chunks first.")
+
+        if not queries:
             return []
-        
+
         # Ensure k doesn't exceed available chunks
         k = min(k, len(self.chunks))
 
-        query_embedding = self.model.encode(
-            [query],
-            convert_to_numpy=True,
-            normalize_embeddings=True
-        )
+        if query_embeddings is None:
+            query_embeddings = self.encode_queries(queries)
+        else:
+            query_embeddings = _as_float32(query_embeddings)
+        scores, indices = self.index.search(query_embeddings, k)
 
-        scores, indices = self.index.search(
-            query_embedding.astype(np.float32),
-            k
-        )
+        if self.approximate and self.emb is not None:
+            # Quantized scores are approximate; re-score every query's k hits
+            # exactly in one gather and one batched dot product
+            scores = self.rerank(query_embeddings, indices)
+            order = np.argsort(-scores, axis=1)
+            scores = np.take_along_axis(scores, order, axis=1)
+            indices = np.take_along_axis(indices, order, axis=1)
 
-        results = []
-        for idx, score in zip(indices[0], scores[0]):
-            if idx < len(self.chunks):
-                results.append((self.chunks[idx], float(score)))
+        batch_results = []
+        for row_indices, row_scores in zip(indices, scores):
+            results = []
+            for idx, score in zip(row_indices, row_scores):
+                if 0 <= idx < len(self.chunks):
+                    results.append((self.chunks[idx], float(score)))
+            batch_results.append(results)
 
-        return results
+        return batch_results
 
     # -------------------------------
     # Save
@@ -135,18 +575,72 @@ class VectorStore:
         if self.index is None:
             raise ValueError("Cannot save empty index.")
 
-        faiss.write_index(self.index, os.path.join(save_dir, "index.faiss"))
+        index = self._to_cpu(self.index)
+
+        if self.emb is not None:
+            with _replacing(os.path.join(save_dir, "emb.fp16.npy")) as path:
+                with open(path, "wb") as f:
+                    np.save(f, self.emb)
+
+        if isinstance(index, faiss.IndexFlat):
+            # Unit-norm embeddings survive fp16 with negligible score error,
+            # so store (and later search) half-size codes instead of float32
+            if self.emb is not None:
+                vecs = self.emb.astype(np.float32)
+            else:
+                vecs = index.reconstruct_n(0, index.ntotal)
+            index = faiss.IndexScalarQuantizer(
+                self.embedding_dim,
+                faiss.ScalarQuantizer.QT_fp16,
+                faiss.METRIC_INNER_PRODUCT
+            )
+            index.train(vecs)
+            index.add(vecs)
 
-        with open(os.path.join(save_dir, "chunks.json"), "w") as f:
-            json.dump(self.chunks, f)
+        # An index loaded with IO_FLAG_MMAP may be mapped from this very file
+        with _replacing(os.path.join(save_dir, "index.faiss")) as path:
+            faiss.write_index(index, path)
+
+        self.chunks.save(save_dir)
 
     # -------------------------------
     # Load
     # -------------------------------
-    def load(self, save_dir: str) -> None:
-        self.index = faiss.read_index(os.path.join(save_dir, "index.faiss"))
+    def load(self, save_dir: str, mmap: bool = True) -> None:
+        """
+        Load a saved index.
+
+        With mmap=True, IVF inverted lists are memory-mapped read-only:
+        load is near-instant and the OS pages lists in on demand, at the
+        cost of page faults on first touch and no further adds. Flat
+        indexes are always read into RAM, since every query scans all of
+        their codes and mapping them would only add page-fault latency.
+        """
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+        index = faiss.read_index(os.path.join(save_dir, "index.faiss"), flags)
+
+        if isinstance(index, faiss.IndexIVF):
+            index.nprobe = self.nprobe
+        if isinstance(index, faiss.IndexIVFPQ):
+            # Trade a little L2 search speed for not holding nlist x M x 256 floats
+            index.use_precomputed_table = 0
+            index.precomputed_table.resize(0)
+        if isinstance(index, faiss.IndexHNSW):
+            index.hnsw.efSearch = self.ef_search
+        self.approximate = self._is_quantized(index)
+        self.index = self._to_gpu(index)
+
+        # Memory-mapped: only the rows being re-scored are paged in
+        emb_path = os.path.join(save_dir, "emb.fp16.npy")
+        self.emb = np.load(emb_path, mmap_mode="r") if os.path.exists(emb_path) else None
 
-        with open(os.path.join(save_dir, "chunks.json"), "r") as f:
-            self.chunks = json.load(f)
+        legacy_path = os.path.join(save_dir, "chunks.json")
+        if os.path.exists(os.path.join(save_dir, "chunks.npz")):
+            self.chunks = ChunkStore.load(save_dir)
+        else:
+            # Indexes saved before the columnar format
+            self.chunks = ChunkStore()
+            with open(legacy_path, "r") as f:
+                self.chunks.extend(json.load(f))
 
         self.embedding_dim = self.index.d
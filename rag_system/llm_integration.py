@@ -1,13 +1,24 @@
 """LLM integration module (Kaggle-compatible, no LangChain, no Ollama)."""
 
-from typing import List, Dict, Any
+import logging
+from typing import Any, Dict, Iterator, List
 
 from rag_system.hf_llm import HFLLM
 
+logger = logging.getLogger(__name__)
+
+# Returned when generation raised (e.g. CUDA OOM); must never be cached
+GENERATION_ERROR = "Unable to generate answer at this time."
+
 
 class RAGPrompt:
     """Manages RAG prompts and response generation."""
     
+    # Fixed text around the per-query context and question
+    CONTEXT_PREFIX = "\n\nContext:\n"
+    QUESTION_PREFIX = "\n\nQuestion: "
+    ANSWER_PREFIX = "\n\nAnswer:"
+    
     @staticmethod
     def get_system_prompt() -> str:
         return (
@@ -21,11 +32,15 @@ class RAGPrompt:
     @staticmethod
     def create_answer_prompt(query: str, context: str) -> str:
         system_prompt = RAGPrompt.get_system_prompt()
+        return system_prompt + RAGPrompt.create_user_prompt(query, context)
+    
+    @staticmethod
+    def create_user_prompt(query: str, context: str) -> str:
+        """Per-query part of the prompt that follows the system prompt."""
         return (
-            f"{system_prompt}\n\n"
-            f"Context:\n{context}\n\n"
-            f"Question: {query}\n\n"
-            f"Answer:"
+            f"{RAGPrompt.CONTEXT_PREFIX}{context}"
+            f"{RAGPrompt.QUESTION_PREFIX}{query}"
+            f"{RAGPrompt.ANSWER_PREFIX}"
         )
     
     @staticmethod
@@ -63,15 +78,29 @@ class LLMIntegration:
         self,
         model_name: str = "microsoft/Phi-3-mini-4k-instruct",
         temperature: float = 0.3,
-        max_tokens: int = 300
+        max_tokens: int = 300,
+        compile_model: bool = False
     ):
         self.temperature = temperature
         self.max_tokens = max_tokens
         try:
-            self.llm = HFLLM(model_name)
+            # compile_model: the first calls per length bucket compile
+            # (tens of seconds); later calls replay the compiled graph
+            self.llm = HFLLM(model_name, compile_model=compile_model)
+            self.llm.prime_system(RAGPrompt.get_system_prompt())
         except Exception as e:
-            print(f"Error loading model: {e}")
+            logger.error("Error loading model: %s", e)
             raise
+        
+        # Only the user part is tokenized per query and appended to the
+        # cached system ids; fall back to whole prompts if that splice does
+        # not reproduce the tokenization of the full prompt
+        self._splice_ok = self._check_splice()
+        if not self._splice_ok:
+            logger.warning(
+                "Tokenizer does not split cleanly after the system prompt; "
+                "encoding whole prompts without the system KV cache"
+            )
     
     def generate_answer(self, query: str, chunks: List[Dict]) -> str:
         """Generate answer from retrieved chunks."""
@@ -83,33 +112,105 @@ class LLMIntegration:
             if not chunks:
                 return "No relevant information found in the documents."
             
-            # Format context and create prompt
+            # Format context; the system prompt is already tokenized
             context = RAGPrompt.format_context(chunks)
-            prompt = RAGPrompt.create_answer_prompt(query, context)
+            return self.generate_from_context(query, context)
             
+        except Exception as e:
+            logger.error("Error generating answer: %s", e)
+            return GENERATION_ERROR
+    
+    def generate_from_context(self, query: str, context: str) -> str:
+        """Generate an answer from an already formatted context string."""
+        try:
             # Generate response
-            response = self.llm.generate(
-                prompt, 
-                max_tokens=self.max_tokens
-            )
+            if self._splice_ok:
+                response = self.llm.generate_with_system_ids(
+                    self._user_ids([query], [context])[0], 
+                    max_tokens=self.max_tokens
+                )
+            else:
+                response = self.llm.generate(
+                    RAGPrompt.create_answer_prompt(query, context),
+                    max_tokens=self.max_tokens
+                )
             
             return response.strip() if response else "Unable to generate a response."
             
         except Exception as e:
-            print(f"Error generating answer: {e}")
-            return "Unable to generate answer at this time."
+            logger.error("Error generating answer: %s", e)
+            return GENERATION_ERROR
+    
+    def generate_from_context_stream(self, query: str, context: str) -> Iterator[str]:
+        """Like generate_from_context, but yields text pieces while decoding."""
+        try:
+            if self._splice_ok:
+                yield from self.llm.stream_with_system_ids(
+                    self._user_ids([query], [context])[0],
+                    max_tokens=self.max_tokens
+                )
+            else:
+                yield from self.llm.stream(
+                    RAGPrompt.create_answer_prompt(query, context),
+                    max_tokens=self.max_tokens
+                )
+        except Exception as e:
+            logger.error("Error generating answer: %s", e)
+            yield GENERATION_ERROR
+    
+    def _user_ids(self, queries: List[str], contexts: List[str]) -> List[List[int]]:
+        """Token ids of each user prompt, as it follows the system prompt."""
+        return self.llm.encode_continuation([
+            RAGPrompt.create_user_prompt(query, context)
+            for query, context in zip(queries, contexts)
+        ])
+    
+    def _check_splice(self) -> bool:
+        """Whether system ids + _user_ids equal the full prompt's tokenization."""
+        query = "What was Apple's total revenue for fiscal 2024?"
+        context = "[Apple 10-K - Page 28]\nTotal net sales were $391,035 million."
+        
+        spliced = self.llm.system_ids[0].tolist() + self._user_ids([query], [context])[0]
+        whole = self.llm.tokenizer(RAGPrompt.create_answer_prompt(query, context)).input_ids
+        return spliced == whole
+    
+    def generate_batch(self, queries: List[str], contexts: List[str]) -> List[str]:
+        """Generate answers for (question, formatted context) pairs in one padded batch."""
+        if not queries:
+            return []
+        
+        try:
+            if self._splice_ok:
+                # Reuse the system ids; only the user parts are tokenized
+                system_ids = self.llm.system_ids[0].tolist()
+                rows = [system_ids + user_ids for user_ids in self._user_ids(queries, contexts)]
+                responses = self.llm.generate_batch_ids(rows, max_tokens=self.max_tokens)
+            else:
+                prompts = [
+                    RAGPrompt.create_answer_prompt(query, context)
+                    for query, context in zip(queries, contexts)
+                ]
+                responses = self.llm.generate_batch(prompts, max_tokens=self.max_tokens)
+            
+            return [
+                response.strip() if response else "Unable to generate a response."
+                for response in responses
+            ]
+            
+        except Exception as e:
+            logger.error("Error generating answers: %s", e)
+            return [GENERATION_ERROR] * len(queries)
     
     def generate_with_sources(self, query: str, chunks: List[Dict]) -> Dict[str, Any]:
         """Generate answer with source information."""
         answer = self.generate_answer(query, chunks)
         
-        sources = []
-        for chunk in chunks:
-            doc = chunk.get("document", "UnknownDoc")
-            page = chunk.get("page")
-            source = f"{doc}, p. {page}" if page else doc
-            if source not in sources:
-                sources.append(source)
+        # Order-preserving dedup without the quadratic list membership test
+        sources = list(dict.fromkeys(
+            f"{chunk.get('document', 'UnknownDoc')}, p. {chunk['page']}"
+            if chunk.get("page") else chunk.get("document", "UnknownDoc")
+            for chunk in chunks
+        ))
         
         return {
             "answer": answer,
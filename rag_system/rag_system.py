@@ -1,11 +1,94 @@
 """Main RAG system orchestrator (Kaggle + HF compatible)."""
 
 import os
+import re
 import json
-from typing import Dict, List
-from rag_system.ingestion import DocumentIngestor, VectorStore
+import logging
+import asyncio
+import hashlib
+import itertools
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import lru_cache
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # optional; only makes result writing faster
+    orjson = None
+
+try:
+    import zstandard as zstd
+except ImportError:  # optional; only needed for compressed results
+    zstd = None
+
+from rag_system.cache import SemanticCache, TTLCache
+from rag_system.ingestion import DocumentIngestor, VectorStore, _replacing
 from rag_system.retriever import RetrieverWithReranker
-from rag_system.llm_integration import LLMIntegration, RAGPrompt
+from rag_system.llm_integration import GENERATION_ERROR, LLMIntegration, RAGPrompt
+
+logger = logging.getLogger(__name__)
+
+
+_OOS_KEYWORDS = (
+    "stock price forecast",
+    "future price",
+    "predict",
+    "2025",
+    "next quarter",
+    "next year",
+    "color",
+    "painted",
+    "weather",
+    "climate change",
+    "political",
+    "stock recommendation"
+)
+
+# All out-of-scope keywords as one case-insensitive alternation: a single
+# scan per query, with no lowercased copy of the query
+_OOS_PATTERN = re.compile(
+    "|".join(map(re.escape, _OOS_KEYWORDS)),
+    re.IGNORECASE
+)
+
+
+def _json_line(entry: Dict) -> bytes:
+    """Serialize one result as a JSON-lines record."""
+    if orjson is not None:
+        return orjson.dumps(entry) + b"\n"
+    return (json.dumps(entry) + "\n").encode("utf-8")
+
+
+def _load_embedding_cache(path: Optional[str]) -> Optional[Tuple[List[Dict], np.ndarray]]:
+    """Return (chunks, embeddings) saved at path, or None on a cache miss."""
+    if path is None or not os.path.exists(path):
+        return None
+
+    try:
+        with np.load(path) as data:
+            return json.loads(str(data["chunks"])), data["embeddings"]
+    except (zipfile.BadZipFile, OSError, EOFError, KeyError, ValueError) as e:
+        # Truncated or otherwise unreadable: re-embed instead of failing
+        logger.warning("Ignoring unreadable embedding cache %s: %s", path, e)
+        return None
+
+
+def _save_embedding_cache(path: str, chunks: List[Dict], embeddings: np.ndarray) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Written aside and moved into place, so a crash never leaves a
+    # truncated file behind
+    with _replacing(path) as tmp_path:
+        with open(tmp_path, "wb") as f:
+            np.savez(f, chunks=np.array(json.dumps(chunks)), embeddings=embeddings)
+
+
+def _parse_document(ingestor: DocumentIngestor, doc: Dict[str, str]) -> List[Dict]:
+    """Parse one PDF; module-level so worker processes can unpickle it."""
+    return ingestor.parse_pdf(doc['path'], doc['name'])
 
 
 class RAGSystem:
@@ -17,12 +100,18 @@ class RAGSystem:
         embedding_model: str = "all-MiniLM-L6-v2",
         chunk_size: int = 500,
         chunk_overlap: int = 50,
-        use_reranker: bool = True
+        use_reranker: bool = True,
+        embedding_backend: str = "torch",
+        embedding_cache_dir: Optional[str] = ".emb_cache",
+        index_type: str = "auto",
+        semantic_cache_threshold: Optional[float] = None,
+        compile_llm: bool = False
     ):
 
-        print("Initializing RAG System...")
+        logger.info("Initializing RAG System...")
 
         self.use_reranker = use_reranker
+        self.embedding_cache_dir = embedding_cache_dir
 
         # ------------------------------
         # Document ingestion
@@ -35,7 +124,12 @@ class RAGSystem:
         # ------------------------------
         # Vector store (FAISS)
         # ------------------------------
-        self.vector_store = VectorStore(model_name=embedding_model)
+        self.vector_store = VectorStore(
+            model_name=embedding_model,
+            backend=embedding_backend,  # "torch" or "onnx"
+            # "auto" picks flat / hnsw / hnsw_sq / ivfpq by corpus size
+            index_type=index_type
+        )
 
         # ------------------------------
         # Retriever WITH reranker
@@ -46,14 +140,36 @@ class RAGSystem:
         )
 
         if self.use_reranker:
-            print("Reranker ENABLED")
+            logger.info("Reranker ENABLED")
         else:
-            print("Reranker DISABLED")
+            logger.info("Reranker DISABLED")
 
         # ------------------------------
-        # HF LLM
+        # HF LLM (loaded on first use, so index-only runs skip it)
         # ------------------------------
-        self.llm = LLMIntegration(model_name=model_name)
+        self._llm = None
+        self._llm_model_name = model_name
+        self._compile_llm = compile_llm
+        self._llm_lock = threading.Lock()
+        # The async paths generate on this one thread: a single model must
+        # not decode several prompts at once (compiled CUDA graphs included)
+        self._llm_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="llm")
+
+        # Answers for a given index, keyed by the normalized query (no expiry;
+        # cleared whenever the index changes)
+        self._answer_cache = TTLCache(max_items=256, ttl_sec=float("inf"))
+
+        # Paraphrases scoring >= semantic_cache_threshold (cosine) reuse an
+        # earlier answer. Off by default: MiniLM puts questions that differ
+        # only in year or company above 0.87, and those must not share answers
+        self.semantic_cache = (
+            SemanticCache(threshold=semantic_cache_threshold, max_items=1024)
+            if semantic_cache_threshold is not None
+            else None
+        )
+
+        # Exact repeats within a session skip FAISS search and the reranker
+        self._retrieval_cache = TTLCache(max_items=2048, ttl_sec=60)
 
         self.indexed = False
 
@@ -63,22 +179,103 @@ class RAGSystem:
 
     def ingest_documents(self, documents: List[Dict[str, str]]) -> None:
 
-        print("Starting document ingestion...")
-        all_chunks = []
+        logger.info("Starting document ingestion...")
+
+        # Unchanged PDFs reuse their chunks and embeddings from disk
+        cache_paths = [self._embedding_cache_path(doc) for doc in documents]
+        cached = [_load_embedding_cache(path) for path in cache_paths]
+        to_parse = [doc for doc, hit in zip(documents, cached) if hit is None]
+
+        for doc, hit in zip(documents, cached):
+            if hit is None:
+                logger.info("Processing %s from %s...", doc['name'], doc['path'])
+            else:
+                logger.info("Using cached embeddings for %s", doc['name'])
+
+        chunk_lists = self._parse_documents(to_parse) if to_parse else []
+        new_texts = [chunk["text"] for chunks in chunk_lists for chunk in chunks]
+
+        # One encode call for every document that missed the cache
+        if new_texts:
+            logger.info("Creating embeddings...")
+            new_embeddings = self.vector_store.embed(new_texts)
+            bounds = np.cumsum([len(chunks) for chunks in chunk_lists])[:-1]
+            embedding_lists = np.split(new_embeddings, bounds)
+        else:
+            embedding_lists = [None] * len(chunk_lists)
+
+        parsed = iter(zip(chunk_lists, embedding_lists))
+        for i, (doc, path) in enumerate(zip(documents, cache_paths)):
+            if cached[i] is not None:
+                continue
+            chunks, embeddings = next(parsed)
+            logger.info("  %s: created %d chunks", doc['name'], len(chunks))
+            cached[i] = (chunks, embeddings)
+            if path is not None and chunks:
+                _save_embedding_cache(path, chunks, embeddings)
 
-        for doc in documents:
-            print(f"Processing {doc['name']} from {doc['path']}...")
-            chunks = self.ingestor.parse_pdf(doc['path'], doc['name'])
-            all_chunks.extend(chunks)
-            print(f"  Created {len(chunks)} chunks")
+        all_chunks = list(itertools.chain.from_iterable(chunks for chunks, _ in cached))
+        all_embeddings = [embeddings for chunks, embeddings in cached if chunks]
 
-        print(f"Total chunks created: {len(all_chunks)}")
+        logger.info("Total chunks created: %d", len(all_chunks))
 
-        print("Creating embeddings and indexing...")
-        self.vector_store.add_chunks(all_chunks)
+        logger.info("Indexing...")
+        if all_chunks:
+            self.vector_store.add_precomputed(all_chunks, np.concatenate(all_embeddings))
+        self._clear_caches()
 
         self.indexed = True
-        print("Indexing complete!")
+        logger.info("Indexing complete!")
+
+    @property
+    def llm(self) -> LLMIntegration:
+        # Locked: the async paths may touch this from several worker threads
+        if self._llm is None:
+            with self._llm_lock:
+                if self._llm is None:
+                    self._llm = LLMIntegration(
+                        model_name=self._llm_model_name,
+                        compile_model=self._compile_llm
+                    )
+        return self._llm
+
+    def _parse_documents(self, documents: List[Dict[str, str]]) -> List[List[Dict]]:
+        # PDF parsing is CPU-bound and independent per document. Processes,
+        # not threads: PDFium is not thread-safe even though it drops the GIL
+        max_workers = min(len(documents), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(
+                _parse_document,
+                [self.ingestor] * len(documents),
+                documents
+            ))
+
+    def _embedding_cache_path(self, doc: Dict[str, str]) -> Optional[str]:
+        """
+        Cache file for a document, keyed by a BLAKE2b hash of the PDF bytes
+        plus everything that shapes its chunks and vectors (including the
+        encoder backend, device, precision and max sequence length).
+        """
+        if self.embedding_cache_dir is None:
+            return None
+
+        digest = hashlib.blake2b(digest_size=16)
+        with open(doc['path'], "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        digest.update(
+            f"|{doc['name']}|{self.vector_store.encoder_signature}"
+            f"|{self.ingestor.chunk_size}|{self.ingestor.overlap}".encode("utf-8")
+        )
+
+        return os.path.join(self.embedding_cache_dir, f"{digest.hexdigest()}.npz")
+
+    def _clear_caches(self) -> None:
+        """Drop every cached answer and retrieval; called when the index changes."""
+        self._answer_cache.clear()
+        if self.semantic_cache is not None:
+            self.semantic_cache.clear()
+        self._retrieval_cache.clear()
 
     # ------------------------------------------------------------
     # QUESTION ANSWERING
@@ -86,38 +283,312 @@ class RAGSystem:
 
     def answer_question(self, query: str) -> Dict:
 
-        if not self.indexed:
+        # Normalized form is only a cache key; the caller's text is answered
+        key = self._normalize_query(query)
+
+        # Out-of-scope questions need neither the index nor any model
+        if self._is_out_of_scope(key):
             return {
-                "answer": "Error: System not yet indexed. Please ingest documents first.",
+                "answer": "This question cannot be answered based on the provided documents.",
                 "sources": []
             }
 
-        if self._is_out_of_scope(query):
+        if not self.indexed:
             return {
-                "answer": "This question cannot be answered based on the provided documents.",
+                "answer": "Error: System not yet indexed. Please ingest documents first.",
                 "sources": []
             }
 
+        # Repeats that differ only in case/whitespace replay the cached answer
+        result = self._answer_cache.get(key)
+        if result is None:
+            result = self._answer(query)
+            if self._is_cacheable(result):
+                self._answer_cache.set(key, result)
+
+        return dict(result)
+
+    def answer_question_stream(self, query: str) -> Iterator[Union[str, Dict]]:
+        """
+        Stream an answer while Phi-3 decodes it.
+
+        Yields text pieces as they are generated, then one final dict with
+        the full answer and its sources (the same shape as answer_question).
+        Settled answers (out of scope, nothing retrieved, not indexed) come
+        as a single piece.
+        """
+
+        if self.indexed:
+            context, result = self._retrieve_and_format([query])[0]
+        else:
+            context, result = None, self.answer_question(query)
+
+        if context is None:
+            yield result["answer"]
+            yield result
+            return
+
+        pieces = []
+        for piece in self.llm.generate_from_context_stream(query, context):
+            pieces.append(piece)
+            yield piece
+
+        yield {
+            "answer": "".join(pieces).strip() or "Unable to generate a response.",
+            "sources": result["sources"]
+        }
+
+    def _answer(self, query: str) -> Dict:
+        """Answer an in-scope query (memoized in _answer_cache by answer_question)."""
+
+        # ------------------------------------------------
+        # STEP 0: Semantic cache (skips retrieval and decoding)
+        # ------------------------------------------------
+        # Encoded once: the same embedding probes the cache and the index
+        query_embs = self.vector_store.encode_queries([query])
+
+        if self.semantic_cache is not None:
+            cached = self.semantic_cache.get(query_embs[0])
+            if cached is not None:
+                return cached
+
         # ------------------------------------------------
         # STEP 1: Vector Retrieval (Top 10 initial)
         # ------------------------------------------------
-        retrieved_chunks = self.retriever.retrieve(
-            query=query,
+        retrieved_chunks = self._retrieve_batch([query], query_embs)[0]
+
+        result = self._generate(query, retrieved_chunks)
+        # Failures would otherwise be served to every paraphrase
+        if self.semantic_cache is not None and self._is_cacheable(result):
+            self.semantic_cache.put(query_embs[0], result)
+
+        return result
+
+    def answer_questions(self, queries: List[str]) -> List[Dict]:
+        """
+        Answer several questions with one batched retrieval pass and one
+        padded LLM generate call.
+        Out-of-scope questions are answered without touching the index,
+        and repeated questions (after normalization) are answered once.
+        """
+
+        if not self.indexed:
+            return [self.answer_question(query) for query in queries]
+
+        # Dedup on the normalized key, but answer the first caller's wording
+        keys = [self._normalize_query(query) for query in queries]
+        originals = {}
+        for key, query in zip(keys, queries):
+            originals.setdefault(key, query)
+        unique = list(originals)
+
+        prepared = self._retrieve_and_format(list(originals.values()))
+        to_run = [
+            (originals[key], context)
+            for key, (context, _) in zip(unique, prepared)
+            if context is not None
+        ]
+        texts = iter(self._llm_batch(
+            [query for query, _ in to_run],
+            [context for _, context in to_run]
+        ))
+
+        # Re-stitch generated answers with the already-settled ones
+        answers = {}
+        for key, (context, result) in zip(unique, prepared):
+            if context is not None:
+                result = {"answer": next(texts), "sources": result["sources"]}
+            answers[key] = result
+
+        return [dict(answers[key]) for key in keys]
+
+    async def answer_question_async(self, query: str) -> Dict:
+        """
+        answer_question for callers running an event loop.
+
+        Retrieval runs in worker threads and generation on the single LLM
+        thread, so the loop stays free. On the first in-scope call the LLM
+        loads in parallel with retrieval. Shares the exact-match answer
+        cache with answer_question; the semantic cache is not consulted.
+        """
+
+        # Out-of-scope (and not-indexed) answers never load a model
+        key = self._normalize_query(query)
+        if not self.indexed or self._is_out_of_scope(key):
+            return self.answer_question(query)
+
+        cached = self._answer_cache.get(key)
+        if cached is not None:
+            return dict(cached)
+
+        loop = asyncio.get_running_loop()
+
+        prepared, llm = await asyncio.gather(
+            loop.run_in_executor(None, self._retrieve_and_format, [query]),
+            loop.run_in_executor(None, lambda: self.llm)
+        )
+        context, result = prepared[0]
+
+        if context is None:
+            return result
+
+        answer = await loop.run_in_executor(
+            self._llm_executor, llm.generate_from_context, query, context
+        )
+        result = {"answer": answer, "sources": result["sources"]}
+        if self._is_cacheable(result):
+            self._answer_cache.set(key, result)
+
+        return dict(result)
+
+    async def answer_questions_stream(
+        self,
+        queries: Iterable[str],
+        prefetch: int = 4
+    ) -> AsyncIterator[Dict]:
+        """
+        Answer questions in order, yielding each result as soon as it is ready.
+
+        A background task retrieves up to prefetch questions ahead on the
+        CPU while the current answer decodes on the GPU, so retrieval for
+        question K+1 overlaps generation for question K. Answer caches are
+        not consulted.
+        """
+
+        if not self.indexed:
+            for query in queries:
+                yield self.answer_question(query)
+            return
+
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=prefetch)
+
+        async def retrieve_ahead():
+            try:
+                for query in queries:
+                    prepared = await loop.run_in_executor(
+                        None, self._retrieve_and_format, [query]
+                    )
+                    await queue.put((query, *prepared[0]))
+            except Exception as e:
+                # Surface the failure to the consumer instead of stalling it
+                await queue.put(e)
+                return
+            await queue.put(None)
+
+        producer = asyncio.create_task(retrieve_ahead())
+        llm = None
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+
+                query, context, result = item
+                if context is not None:
+                    if llm is None:
+                        # Loaded on first need; retrieval keeps prefetching
+                        # meanwhile, and all-settled streams never load it
+                        llm = await loop.run_in_executor(None, lambda: self.llm)
+                    answer = await loop.run_in_executor(
+                        self._llm_executor, llm.generate_from_context, query, context
+                    )
+                    result = {"answer": answer, "sources": result["sources"]}
+                yield result
+        finally:
+            producer.cancel()
+
+    def _retrieve_and_format(self, queries: List[str]) -> List[Tuple[Optional[str], Dict]]:
+        """
+        Batched retrieval and context formatting for several questions.
+
+        Returns one (context, result) pair per query. A context of None
+        means the question is already settled (out of scope or nothing
+        retrieved) and result is its final answer; otherwise result holds
+        the sources and the context still has to go through the LLM.
+        """
+
+        prepared = [None] * len(queries)
+        in_scope = []
+
+        for i, query in enumerate(queries):
+            # Classify the normalized key, as answer_question does, so every
+            # entry point agrees on e.g. "next\n year" split across lines
+            if self._is_out_of_scope(self._normalize_query(query)):
+                prepared[i] = (None, {
+                    "answer": "This question cannot be answered based on the provided documents.",
+                    "sources": []
+                })
+            else:
+                in_scope.append(i)
+
+        retrieved = self._retrieve_batch([queries[i] for i in in_scope])
+
+        for i, retrieved_chunks in zip(in_scope, retrieved):
+            if not retrieved_chunks:
+                prepared[i] = (None, {
+                    "answer": "Not specified in the document.",
+                    "sources": []
+                })
+            else:
+                prepared[i] = (
+                    RAGPrompt.format_context(retrieved_chunks),
+                    {"sources": self.retriever.format_sources(retrieved_chunks)}
+                )
+
+        return prepared
+
+    def _retrieve_batch(
+        self,
+        queries: List[str],
+        query_embeddings: Optional[np.ndarray] = None
+    ) -> List[List[Dict]]:
+        """
+        Retrieve (top 10 re-ranked down to 5) for queries, serving exact
+        repeats from the retrieval cache and batching the misses.
+        query_embeddings, if given, holds one precomputed row per query.
+        """
+
+        keys = [(query, 10, 5, self.use_reranker) for query in queries]
+        results = [self._retrieval_cache.get(key) for key in keys]
+        misses = [i for i, result in enumerate(results) if result is None]
+
+        retrieved = self.retriever.retrieve_batch(
+            [queries[i] for i in misses],
             top_k=10,                 # retrieve more initially
-            rerank=self.use_reranker  # force reranker usage
+            rerank=self.use_reranker, # force reranker usage
+            final_top_k=5,            # keep top 5 after reranking
+            query_embeddings=(
+                None if query_embeddings is None else query_embeddings[misses]
+            )
         )
 
+        for i, retrieved_chunks in zip(misses, retrieved):
+            # Empty lists may come from a swallowed retrieval error; retry those
+            if retrieved_chunks:
+                self._retrieval_cache.set(keys[i], retrieved_chunks)
+            results[i] = retrieved_chunks
+
+        return results
+
+    def _llm_batch(self, queries: List[str], contexts: List[str]) -> List[str]:
+        """Generate every pending answer in a single padded batch."""
+        # Nothing to generate: don't let self.llm load the model
+        if not queries:
+            return []
+        return self.llm.generate_batch(queries, contexts)
+
+    def _generate(self, query: str, retrieved_chunks: List[Dict]) -> Dict:
+        """Turn retrieved chunks into an answer with sources."""
+
         if not retrieved_chunks:
             return {
                 "answer": "Not specified in the document.",
                 "sources": []
             }
 
-        # ------------------------------------------------
-        # STEP 2: Keep top 5 after reranking
-        # ------------------------------------------------
-        retrieved_chunks = retrieved_chunks[:5]
-
         # ------------------------------------------------
         # STEP 3: Generate answer (HF Phi-3)
         # ------------------------------------------------
@@ -138,26 +609,19 @@ class RAGSystem:
     # ------------------------------------------------------------
 
     @staticmethod
-    def _is_out_of_scope(query: str) -> bool:
-
-        out_of_scope_keywords = [
-            "stock price forecast",
-            "future price",
-            "predict",
-            "2025",
-            "next quarter",
-            "next year",
-            "color",
-            "painted",
-            "weather",
-            "climate change",
-            "political",
-            "stock recommendation"
-        ]
+    def _is_cacheable(result: Dict) -> bool:
+        # Empty retrievals (possibly a swallowed retriever error) and failed
+        # generations are retried next time, like in _retrieve_batch
+        return bool(result["sources"]) and result["answer"] != GENERATION_ERROR
 
-        query_lower = query.lower()
+    @staticmethod
+    def _normalize_query(query: str) -> str:
+        return " ".join(query.lower().split())
 
-        return any(keyword in query_lower for keyword in out_of_scope_keywords)
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _is_out_of_scope(query: str) -> bool:
+        return _OOS_PATTERN.search(query) is not None
 
     # ------------------------------------------------------------
     # SAVE / LOAD INDEX
@@ -166,17 +630,30 @@ class RAGSystem:
     def save_index(self, save_dir: str) -> None:
         os.makedirs(save_dir, exist_ok=True)
         self.vector_store.save(save_dir)
-        print(f"Index saved to {save_dir}")
+        logger.info("Index saved to %s", save_dir)
 
-    def load_index(self, save_dir: str) -> None:
-        self.vector_store.load(save_dir)
+    def load_index(self, save_dir: str, mmap: bool = True) -> None:
+        self.vector_store.load(save_dir, mmap=mmap)
+        self._clear_caches()
         self.indexed = True
-        print(f"Index loaded from {save_dir}")
-
-def run_evaluation(rag_system: RAGSystem) -> List[Dict]: 
+        logger.info("Index loaded from %s", save_dir)
+
+def run_evaluation(
+    rag_system: RAGSystem,
+    batch_size: Optional[int] = None,
+    compress: bool = False,
+    pretty: bool = False
+) -> List[Dict]: 
     """Run the evaluation on all test questions. 
+    All questions go through one padded LLM batch unless batch_size is set.
+    compress: write zstd-compressed JSON lines (.jsonl.zst); read back with
+        zstandard.ZstdDecompressor().stream_reader(f)
+    pretty: also write an indented .json copy for reading by eye
     Returns: List of answer dictionaries with question_id, answer, and sources 
     """ 
+    if compress and zstd is None:
+        raise ImportError("compress=True requires the zstandard package")
+
     questions = [ {"question_id": 1, "question": "What was Apples total revenue for the fiscal year ended September 28, 2024?"}, 
                  {"question_id": 2, "question": "How many shares of common stock were issued and outstanding as of October 18, 2024?"}, 
                  {"question_id": 3, "question": "What is the total amount of term debt (current + non-current) reported by Apple as of September 28, 2024?"}, 
@@ -192,28 +669,45 @@ def run_evaluation(rag_system: RAGSystem) -> List[Dict]:
                  {"question_id": 13, "question": "What color is Teslas headquarters painted?"} ] 
     
     answers = [] 
-    print("\n" + "="*80) 
-    print("RUNNING EVALUATION ON 13 TEST QUESTIONS") 
-    print("="*80 + "\n") 
+    logger.info("RUNNING EVALUATION ON %d TEST QUESTIONS", len(questions)) 
     
-    for q_data in questions: 
-        print(f"Q{q_data['question_id']}: {q_data['question']}") 
-        result = rag_system.answer_question(q_data['question']) 
-        answer_entry = { "question_id": q_data['question_id'], "answer": result['answer'], "sources": result['sources'] } 
-        answers.append(answer_entry) 
-        print(f"Answer: {result['answer'][:100]}...") 
-        print(f"Sources: {result['sources']}\n")
-
-    # Save results with timestamp 
+    # Results are streamed to a timestamped JSON-lines file batch by batch,
+    # so a crash mid-run keeps every answer written so far
     from datetime import datetime 
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S") 
-    output_file = f"evaluation_results_{timestamp}.json"
-
-    with open(output_file, "w") as f: 
-        json.dump(answers, f, indent=2) 
+    output_file = f"evaluation_results_{timestamp}.jsonl"
+    if compress:
+        output_file += ".zst"
+
+    batch_size = batch_size or len(questions)
+    with ExitStack() as stack:
+        f = stack.enter_context(open(output_file, "wb"))
+        if compress:
+            # Level 3 compresses at hundreds of MB/s; each flush below ends
+            # a zstd block, so a partial file still decodes
+            f = stack.enter_context(zstd.ZstdCompressor(level=3).stream_writer(f))
+
+        for start in range(0, len(questions), batch_size):
+            batch = questions[start:start + batch_size]
+            results = rag_system.answer_questions([q_data['question'] for q_data in batch])
+
+            for q_data, result in zip(batch, results): 
+                # Debug level: formatted (and truncated via %.100s) only when enabled
+                logger.debug("Q%d: %s", q_data['question_id'], q_data['question']) 
+                answer_entry = { "question_id": q_data['question_id'], "answer": result['answer'], "sources": result['sources'] } 
+                answers.append(answer_entry) 
+                f.write(_json_line(answer_entry))
+                logger.debug("Answer: %.100s...", result['answer']) 
+                logger.debug("Sources: %s", result['sources'])
+
+            f.flush()
+
+    if pretty:
+        pretty_file = f"evaluation_results_{timestamp}.json"
+        with open(pretty_file, "w") as f:
+            json.dump(answers, f, indent=2)
+        logger.info("Indented copy saved to %s", pretty_file)
     
-    print("\n" + "="*80) 
-    print(f"Evaluation complete! Results saved to {output_file}") 
-    print("="*80) 
+    logger.info("Evaluation complete! Results saved to %s", output_file) 
     
     return answers
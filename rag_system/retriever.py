@@ -1,10 +1,15 @@
 """Retrieval and re-ranking module."""
 
-from typing import List, Tuple, Dict
+import logging
+import threading
+from typing import List, Optional, Tuple, Dict
+import numpy as np
 from sentence_transformers import CrossEncoder
 from rag_system.ingestion import VectorStore
 import torch
 
+logger = logging.getLogger(__name__)
+
 class RetrieverWithReranker:
     """Retrieves and re-ranks relevant chunks."""
     
@@ -18,16 +23,30 @@ class RetrieverWithReranker:
         """
         self.vector_store = vector_store
         self.use_reranker = use_reranker
-        
-        if use_reranker:
-            # Cross-encoder for better ranking           
-            device = "cuda" if torch.cuda.is_available() else "cpu"
-            self.reranker = CrossEncoder(
-                "cross-encoder/ms-marco-MiniLM-L-6-v2",
-                device=device
-            )
+        self._reranker = None
+        self._reranker_lock = threading.Lock()
+    
+    @property
+    def reranker(self) -> CrossEncoder:
+        """Cross-encoder for better ranking, loaded on first use."""
+        # Locked: async retrieval may reach this from several worker threads
+        if self._reranker is None:
+            with self._reranker_lock:
+                if self._reranker is None:
+                    device = "cuda" if torch.cuda.is_available() else "cpu"
+                    self._reranker = CrossEncoder(
+                        "cross-encoder/ms-marco-MiniLM-L-6-v2",
+                        device=device
+                    )
+        return self._reranker
     
-    def retrieve(self, query: str, top_k: int = 5, rerank: bool = True) -> List[Dict]:
+    def retrieve(
+        self,
+        query: str,
+        top_k: int = 5,
+        rerank: bool = True,
+        final_top_k: Optional[int] = None
+    ) -> List[Dict]:
         """
         Retrieve relevant chunks.
         
@@ -35,64 +54,126 @@ class RetrieverWithReranker:
             query: Search query
             top_k: Number of results to return
             rerank: Whether to apply re-ranking
+            final_top_k: If set, top_k candidates are re-ranked and only
+                the best final_top_k are returned
             
         Returns:
             List of relevant chunks with scores
         """
-        try:
-            if not query.strip():
-                return []
+        return self.retrieve_batch(
+            [query], top_k=top_k, rerank=rerank, final_top_k=final_top_k
+        )[0]
+
+    def retrieve_batch(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        rerank: bool = True,
+        final_top_k: Optional[int] = None,
+        query_embeddings: Optional[np.ndarray] = None
+    ) -> List[List[Dict]]:
+        """
+        Retrieve relevant chunks for several queries with one vector search.
+        
+        Args:
+            queries: Search queries
+            top_k: Number of results to return per query
+            rerank: Whether to apply re-ranking
+            final_top_k: If set, top_k candidates are re-ranked and only
+                the best final_top_k are returned
+            query_embeddings: Optional precomputed embeddings, one row per
+                query, so the vector search skips encoding
             
+        Returns:
+            One list of relevant chunks with scores per query
+        """
+        batch_results = [[] for _ in queries]
+
+        try:
             # Validate vector store has data
             if self.vector_store.index is None or len(self.vector_store.chunks) == 0:
-                return []
-        
+                return batch_results
+
+            active = [i for i, query in enumerate(queries) if query.strip()]
+            if not active:
+                return batch_results
+
             # Initial retrieval with more candidates for re-ranking
-            initial_k = top_k * 3 if rerank and self.use_reranker else top_k
-            results = self.vector_store.search(query, k=initial_k)
-            
-            if rerank and self.use_reranker:
-                # Re-rank using cross-encoder
-                chunks = [r[0] for r in results]
-                texts = [r[0].get("text", "") for r in results]
-                
-                # Compute cross-encoder scores
-                scores = self.reranker.predict([[query, text] for text in texts])
-                
-                # Sort by cross-encoder scores (higher is better)
-                ranked = sorted(
-                    zip(chunks, scores),
-                    key=lambda x: x[1],
-                    reverse=True
+            if final_top_k is not None:
+                initial_k, top_k = top_k, final_top_k
+            elif rerank and self.use_reranker:
+                initial_k = top_k * 3
+            else:
+                initial_k = top_k
+            candidates = self.vector_store.search_batch(
+                [queries[i] for i in active],
+                k=initial_k,
+                query_embeddings=(
+                    None if query_embeddings is None else query_embeddings[active]
                 )
-                
-                # Return top_k
-                return [
-                    {
-                        **chunk,
-                        "score": float(score)
-                    }
-                    for chunk, score in ranked[:top_k]
+            )
+
+            if rerank and self.use_reranker:
+                # One cross-encoder call scores the candidates of every query
+                pairs = [
+                    [queries[i], chunk.get("text", "")]
+                    for i, results in zip(active, candidates)
+                    for chunk, _ in results
                 ]
+                scores = self.reranker.predict(pairs) if pairs else []
+
+                start = 0
+                for i, results in zip(active, candidates):
+                    end = start + len(results)
+                    batch_results[i] = self._rerank(results, scores[start:end], top_k)
+                    start = end
             else:
-                # Return results sorted by distance
-                return [
-                    {
-                        **result[0],
-                        "score": float(result[1])   # Convert distance to similarity
-                    }
-                    for result in results[:top_k]
-                ]
+                for i, results in zip(active, candidates):
+                    # Return results sorted by distance
+                    batch_results[i] = [
+                        {
+                            **chunk,
+                            "score": float(score)   # Cosine similarity
+                        }
+                        for chunk, score in results[:top_k]
+                    ]
+
+            return batch_results
         except Exception as e:
-            print(f"Error during retrieval: {e}")
+            logger.error("Error during retrieval: %s", e)
+            return [[] for _ in queries]
+
+    @staticmethod
+    def _rerank(
+        results: List[Tuple[Dict, float]],
+        scores,
+        top_k: int
+    ) -> List[Dict]:
+        """Order one query's candidates by cross-encoder score, keep top_k."""
+        scores = np.asarray(scores)
+        k = min(top_k, len(scores))
+        if k == 0:
             return []
+
+        # Select the top_k in O(n), then sort only those (higher is better)
+        top_idx = np.argpartition(-scores, k - 1)[:k]
+        top_idx = top_idx[np.argsort(-scores[top_idx])]
+
+        # Return top_k
+        return [
+            {
+                **results[i][0],
+                "score": float(scores[i])
+            }
+            for i in top_idx
+        ]
     
     @staticmethod
     def format_sources(chunks: List[Dict]) -> List[str]:
         """Format chunks into source citations."""
-        sources = []
-        for chunk in chunks:
-            sources.append(
-                f"{chunk.get('document', 'UnknownDoc')}, p. {chunk.get('page', 'N/A')}"
-            )
-        return list(set(sources))  # Remove duplicates
+        # dict.fromkeys drops duplicates in one C-level pass and, unlike a
+        # set, keeps the ranking order (and is deterministic across runs)
+        return list(dict.fromkeys(
+            f"{chunk.get('document', 'UnknownDoc')}, p. {chunk.get('page', 'N/A')}"
+            for chunk in chunks
+        ))